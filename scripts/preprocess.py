@@ -1,206 +1,332 @@
+import multiprocessing
 import os
-import csv
-import re
-from collections import defaultdict
+
+import numpy as np
 
 # CONFIGURATION
-INPUT_NGRAMS = "../data/ngrams-all.tsv" 
+INPUT_NGRAMS = "../data/ngrams-all.tsv"
 INPUT_WORDS = "../data/google-books-common-words.txt"
 OUTPUT_DIR = "../data/corpora/default"
 
+# Allowed token characters (alpha, numbers, and symbols). Validation is a
+# single C-level bytes.translate against the disallowed set instead of a
+# regex call per line.
+ALLOWED_CHARS = b"abcdefghijklmnopqrstuvwxyz0123456789.,;:?/-!@#$%^&*()[]{}<>=+|\\_~'"
+DISALLOWED_BYTES = bytes(b for b in range(256) if b not in ALLOWED_CHARS)
+
+# Punctuation/symbol heuristics as fractions of total corpus characters.
+PUNCT_RATIOS = (
+    # --- Standard Prose ---
+    ('.', 0.012),
+    (',', 0.015),
+    ('\'', 0.005),  # Apostrophe
+    ('"', 0.003),
+    (';', 0.002),
+    (':', 0.002),
+    ('?', 0.001),
+    ('!', 0.001),
+    ('-', 0.005),
+    ('/', 0.003),  # URLs/Paths
+    # --- Numbers ---
+    # Approx 2% of text is numeric in general corpus, split evenly
+    *((d, 0.002) for d in "0123456789"),
+    # --- Modern/Code Symbols ---
+    ('@', 0.001),
+    ('#', 0.0005),
+    ('$', 0.0005),
+    ('%', 0.0005),
+    ('&', 0.001),
+    ('*', 0.001),
+    ('(', 0.002),
+    (')', 0.002),
+    ('[', 0.0005),
+    (']', 0.0005),
+    ('{', 0.0002),
+    ('}', 0.0002),
+    ('<', 0.0002),
+    ('>', 0.0002),
+    ('=', 0.001),
+    ('+', 0.0005),
+    ('|', 0.0001),
+    ('\\', 0.0002),
+    ('_', 0.001),
+    # Enter/Return tracks sentence ends
+    ('\n', 0.012),
+)
+
 def ensure_dir(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
+# Byte values that may open an "N-gram" section header ('1'..'9').
+_HEADER_DIGITS = frozenset(b"123456789")
+
+def _find_header(block, start=0):
+    """Returns the offset of the next "N-gram" section header line in
+    block, or -1. Headers are only recognized at line starts."""
+    p = block.find(b"-gram", start)
+    while p != -1:
+        i = p - 1
+        if i >= 0 and block[i] in _HEADER_DIGITS and (i == 0 or block[i - 1] == 10):
+            return i
+        p = block.find(b"-gram", p + 5)
+    return -1
+
+def iter_section_chunks(path, bufsize=4 << 20):
+    """Yields (n, chunk) pairs: line-aligned binary chunks of the TSV
+    tagged with the gram section they belong to.
+
+    Reads in 4 MiB blocks, carries the partial tail line across block
+    boundaries, and tracks the section state machine here so the chunks
+    can be parsed independently (and in parallel). Stops at 4-gram.
+    """
+    current_n = 0
+    tail = b""
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            data = f.read(bufsize)
+            if not data:
+                block = tail
+            else:
+                block = tail + data
+                cut = block.rfind(b"\n")
+                if cut < 0:
+                    tail = block
+                    continue
+                tail = block[cut + 1:]
+                block = block[:cut]
+
+            pos = 0
+            while pos < len(block):
+                h = _find_header(block, pos)
+                if h == -1:
+                    if current_n:
+                        yield current_n, block[pos:]
+                    break
+                if h > pos and current_n:
+                    yield current_n, block[pos:h]
+                current_n = block[h] - 48
+                if current_n >= 4:
+                    return
+                nl = block.find(b"\n", h)
+                pos = len(block) if nl == -1 else nl + 1
+
+            if not data:
+                return
+
+def _parse_ngram_chunk(args):
+    """Worker: parses one section-tagged chunk into formatted CSV rows.
+
+    Returns (n, rows) where rows is a single bytes blob, keeping the
+    inter-process traffic to one object per chunk.
+    """
+    n, data = args
+    out = []
+    append = out.append
+    disallowed = DISALLOWED_BYTES  # local binding: skip a global load per line
+    for line in data.split(b"\n"):
+        line = line.rstrip(b"\r")
+        if not line: continue
+
+        parts = line.split(b'\t')
+        if len(parts) < 2: continue
+
+        token = parts[0].lower()
+        try:
+            count = int(parts[1])
+        except:
+            continue
+
+        # Pure-ASCII validator: if translate deletes nothing, every
+        # byte is in the allowed class.
+        if not token or len(token.translate(None, disallowed)) != len(token):
+            continue
+
+        if b',' in token:
+            # Rare slow path: comma tokens need quoting.
+            text = token.decode()
+            if n == 1:
+                append(f"{csv_field(text)},{count}\n".encode())
+            elif n == 2 and len(token) == 2:
+                append(f"{csv_field(text[0])},{csv_field(text[1])},{count}\n".encode())
+            elif n == 3 and len(token) == 3:
+                append(f"{csv_field(text[0])},{csv_field(text[1])},{csv_field(text[2])},{count}\n".encode())
+        elif n == 1:
+            append(b"%s,%d\n" % (token, count))
+        elif n == 2 and len(token) == 2:
+            append(b"%c,%c,%d\n" % (token[0], token[1], count))
+        elif n == 3 and len(token) == 3:
+            append(b"%c,%c,%c,%d\n" % (token[0], token[1], token[2], count))
+
+    return n, b"".join(out)
+
+def csv_field(value):
+    # Minimal RFC-4180 quoting for the Rust csv reader. Validated tokens
+    # never contain quotes, but the injected punctuation table does.
+    if '"' in value:
+        return '"' + value.replace('"', '""') + '"'
+    return f'"{value}"' if ',' in value else value
+
 def load_word_freqs():
     print(f"📊 Analyzing Word Boundaries in {INPUT_WORDS}...")
     word_freqs = {}
-    
+
+    # Lowercase the whole file in one C call instead of per line;
+    # splitlines already strips the line endings.
     with open(INPUT_WORDS, "r", encoding="utf-8") as f:
-        for line in f:
-            parts = line.split('\t')
-            if not parts: continue
-            
-            word = parts[0].lower().strip()
-            
-            try:
-                freq = int(parts[1]) if len(parts) > 1 else 100
-            except ValueError:
-                freq = 100
-
-            # Allow alpha, numbers, and basic word-internal symbols (apostrophe, dash)
-            if len(word) > 0:
-                word_freqs[word] = freq
-                
-    return word_freqs
-
-def generate_implied_spaces(word_freqs):
+        data = f.read().lower()
+
+    for line in data.splitlines():
+        parts = line.split('\t')
+        word = parts[0]
+
+        try:
+            freq = int(parts[1]) if len(parts) > 1 else 100
+        except ValueError:
+            freq = 100
+
+        # Allow alpha, numbers, and basic word-internal symbols (apostrophe, dash)
+        if len(word) > 0:
+            word_freqs[word] = freq
+
+    # Pre-partition by length once: single-char words only contribute
+    # space bigrams, multi-char words also contribute trigrams. Buckets
+    # are built from the final dict so duplicate lines keep last-wins.
+    short_items, long_items = [], []
+    for item in word_freqs.items():
+        (long_items if len(item[0]) >= 2 else short_items).append(item)
+
+    return word_freqs, short_items, long_items
+
+def generate_implied_spaces(short_items, long_items):
     print("🚀 Generating Implied Space N-Grams...")
-    mono_space = 0
-    bi_space = defaultdict(int)
-    tri_space = defaultdict(int)
-
-    for word, freq in word_freqs.items():
-        if len(word) < 1: continue
-        
-        mono_space += freq
-        
-        first = word[0]
-        bi_space[(' ', first)] += freq
-        
-        last = word[-1]
-        bi_space[(last, ' ')] += freq
-        
-        if len(word) >= 1:
-            if len(word) >= 2:
-                second = word[1]
-                tri_space[(' ', first, second)] += freq
-            
-            if len(word) >= 2:
-                second_last = word[-2]
-                tri_space[(second_last, last, ' ')] += freq
-            
-    return mono_space, bi_space, tri_space
+
+    # Vectorized boundary tally: pull the boundary characters of every
+    # word into flat uint8 arrays (the word list is pure ASCII) and let
+    # np.add.at accumulate the frequency mass per character bucket,
+    # instead of three dict updates per word in the interpreter. The
+    # buckets are length-partitioned at load time, so there are no
+    # per-word length checks here at all.
+    short_freqs = np.fromiter((f for _, f in short_items), dtype=np.int64, count=len(short_items))
+    long_freqs = np.fromiter((f for _, f in long_items), dtype=np.int64, count=len(long_items))
+
+    # Single-char words: the one char is both first and last.
+    short_chars = np.frombuffer("".join(w for w, _ in short_items).encode(), dtype=np.uint8)
+    first = np.frombuffer("".join(w[0] for w, _ in long_items).encode(), dtype=np.uint8)
+    last = np.frombuffer("".join(w[-1] for w, _ in long_items).encode(), dtype=np.uint8)
+
+    mono_space = int(short_freqs.sum() + long_freqs.sum())
+
+    bi_first = np.zeros(256, dtype=np.int64)
+    bi_last = np.zeros(256, dtype=np.int64)
+    np.add.at(bi_first, short_chars, short_freqs)
+    np.add.at(bi_first, first, long_freqs)
+    np.add.at(bi_last, short_chars, short_freqs)
+    np.add.at(bi_last, last, long_freqs)
+
+    # Format rows straight from the accumulators; the dict intermediate
+    # only existed to be iterated once by the writer.
+    bi_rows = []
+    for code in np.nonzero(bi_first)[0]:
+        bi_rows.append(f" ,{csv_field(chr(code))},{int(bi_first[code])}\n".encode())
+    for code in np.nonzero(bi_last)[0]:
+        bi_rows.append(f"{csv_field(chr(code))}, ,{int(bi_last[code])}\n".encode())
+
+    # Trigrams need the second / second-to-last character, so only the
+    # multi-char bucket contributes. Pack two char codes into one uint16.
+    second = np.frombuffer("".join(w[1] for w, _ in long_items).encode(), dtype=np.uint8)
+    second_last = np.frombuffer("".join(w[-2] for w, _ in long_items).encode(), dtype=np.uint8)
+
+    tri_head = np.zeros(1 << 16, dtype=np.int64)
+    tri_tail = np.zeros(1 << 16, dtype=np.int64)
+    np.add.at(tri_head, (first.astype(np.uint16) << 8) | second, long_freqs)
+    np.add.at(tri_tail, (second_last.astype(np.uint16) << 8) | last, long_freqs)
+
+    tri_rows = []
+    for key in np.nonzero(tri_head)[0]:
+        tri_rows.append(f" ,{csv_field(chr(key >> 8))},{csv_field(chr(key & 0xFF))},{int(tri_head[key])}\n".encode())
+    for key in np.nonzero(tri_tail)[0]:
+        tri_rows.append(f"{csv_field(chr(key >> 8))},{csv_field(chr(key & 0xFF))}, ,{int(tri_tail[key])}\n".encode())
+
+    return mono_space, bi_rows, tri_rows
 
 def inject_punctuation_heuristics(total_chars):
     """
     Returns estimated counts for punctuation and symbols.
     Ratios refined for modern usage (emails, urls, light coding).
     """
-    stats = {}
-    
-    # --- Standard Prose ---
-    stats['.'] = int(total_chars * 0.012)
-    stats[','] = int(total_chars * 0.015)
-    stats['\''] = int(total_chars * 0.005) # Apostrophe
-    stats['"'] = int(total_chars * 0.003)
-    stats[';'] = int(total_chars * 0.002)
-    stats[':'] = int(total_chars * 0.002)
-    stats['?'] = int(total_chars * 0.001)
-    stats['!'] = int(total_chars * 0.001)
-    stats['-'] = int(total_chars * 0.005)
-    stats['/'] = int(total_chars * 0.003) # URLs/Paths
-    
-    # --- Numbers (Aggregate if missing) ---
-    # Approx 2% of text is numeric in general corpus
-    digit_pool = int(total_chars * 0.02)
-    for d in "0123456789":
-        stats[d] = int(digit_pool / 10)
-
-    # --- Modern/Code Symbols ---
-    stats['@'] = int(total_chars * 0.001) 
-    stats['#'] = int(total_chars * 0.0005)
-    stats['$'] = int(total_chars * 0.0005)
-    stats['%'] = int(total_chars * 0.0005)
-    stats['&'] = int(total_chars * 0.001)
-    stats['*'] = int(total_chars * 0.001)
-    stats['('] = int(total_chars * 0.002)
-    stats[')'] = int(total_chars * 0.002)
-    stats['['] = int(total_chars * 0.0005)
-    stats[']'] = int(total_chars * 0.0005)
-    stats['{'] = int(total_chars * 0.0002)
-    stats['}'] = int(total_chars * 0.0002)
-    stats['<'] = int(total_chars * 0.0002)
-    stats['>'] = int(total_chars * 0.0002)
-    stats['='] = int(total_chars * 0.001)
-    stats['+'] = int(total_chars * 0.0005)
-    stats['|'] = int(total_chars * 0.0001)
-    stats['\\'] = int(total_chars * 0.0002)
-    stats['_'] = int(total_chars * 0.001)
-    
-    # Enter/Return
-    stats['\n'] = stats['.'] 
-    
-    return stats
+    return {char: int(total_chars * ratio) for char, ratio in PUNCT_RATIOS}
 
 def process_data():
     ensure_dir(OUTPUT_DIR)
     
-    word_freqs = load_word_freqs()
-    mono_space_count, bi_space, tri_space = generate_implied_spaces(word_freqs)
+    word_freqs, short_items, long_items = load_word_freqs()
+    mono_space_count, bi_rows, tri_rows = generate_implied_spaces(short_items, long_items)
     
     total_chars = sum(len(w) * f for w, f in word_freqs.items()) + mono_space_count
     punct_stats = inject_punctuation_heuristics(total_chars)
 
+    # Binary mode + a large buffer keeps the hot loop out of the csv module
+    # and the text-IO layer entirely; rows are pre-formatted bytes.
     files = {
-        1: open(os.path.join(OUTPUT_DIR, "1grams.csv"), "w", newline="", encoding="utf-8"),
-        2: open(os.path.join(OUTPUT_DIR, "2grams.csv"), "w", newline="", encoding="utf-8"),
-        3: open(os.path.join(OUTPUT_DIR, "3grams.csv"), "w", newline="", encoding="utf-8"),
-        'w': open(os.path.join(OUTPUT_DIR, "words.csv"), "w", newline="", encoding="utf-8")
-    }
-    
-    writers = {
-        1: csv.writer(files[1]),
-        2: csv.writer(files[2]),
-        3: csv.writer(files[3]),
-        'w': csv.writer(files['w'])
+        1: open(os.path.join(OUTPUT_DIR, "1grams.csv"), "wb", buffering=1 << 20),
+        2: open(os.path.join(OUTPUT_DIR, "2grams.csv"), "wb", buffering=1 << 20),
+        3: open(os.path.join(OUTPUT_DIR, "3grams.csv"), "wb", buffering=1 << 20),
+        'w': open(os.path.join(OUTPUT_DIR, "words.csv"), "wb", buffering=1 << 20)
     }
 
-    writers[1].writerow(["char", "freq"])
-    writers[2].writerow(["char1", "char2", "freq"])
-    writers[3].writerow(["char1", "char2", "char3", "freq"])
-    writers['w'].writerow(["word", "freq"])
+    files[1].write(b"char,freq\n")
+    files[2].write(b"char1,char2,freq\n")
+    files[3].write(b"char1,char2,char3,freq\n")
+    files['w'].write(b"word,freq\n")
+
+    files['w'].writelines(f"{csv_field(w)},{f}\n".encode() for w, f in word_freqs.items())
 
-    for w, f in word_freqs.items():
-        writers['w'].writerow([w, f])
+    # Rows are batched into lists and handed to writelines in blocks,
+    # saving a Python-level write call per line.
+    buf1, buf2, buf3 = [], [], []
+    emit1 = buf1.append
+    emit2 = buf2.append
+    emit3 = buf3.append
+
+    def flush_rows():
+        if buf1:
+            files[1].writelines(buf1)
+            buf1.clear()
+        if buf2:
+            files[2].writelines(buf2)
+            buf2.clear()
+        if buf3:
+            files[3].writelines(buf3)
+            buf3.clear()
 
     print(f"Processing {INPUT_NGRAMS}...")
-    
-    # Updated Regex to allow numbers and symbols
-    valid_regex = re.compile(r"^[a-z0-9\.,;:\?/\-!@#\$%\^&\*\(\)\[\]\{\}<>=\+\|\\_~']+$")
-    
-    with open(INPUT_NGRAMS, "r", encoding="utf-8") as f:
-        current_n = 0
-        for line in f:
-            line = line.strip()
-            if not line: continue
-
-            if "1-gram" in line: current_n = 1; continue
-            elif "2-gram" in line: current_n = 2; continue
-            elif "3-gram" in line: current_n = 3; continue
-            elif "4-gram" in line: break 
-
-            if current_n == 0: continue
-
-            parts = line.split('\t')
-            if len(parts) < 2: continue
-            
-            token = parts[0].lower()
-            try:
-                count = int(parts[1])
-            except:
-                continue
-
-            if not valid_regex.match(token):
-                continue
-
-            if current_n == 1:
-                writers[1].writerow([token, count])
-            elif current_n == 2 and len(token) == 2:
-                writers[2].writerow([token[0], token[1], count])
-            elif current_n == 3 and len(token) == 3:
-                writers[3].writerow([token[0], token[1], token[2], count])
+
+    # Fan the section-tagged chunks out to a worker pool; imap keeps the
+    # results in file order, so each blob is appended as it completes.
+    with multiprocessing.Pool() as pool:
+        for n, rows in pool.imap(_parse_ngram_chunk, iter_section_chunks(INPUT_NGRAMS)):
+            if rows:
+                files[n].write(rows)
 
     print("💉 Injecting Space & Symbol Data...")
     
-    writers[1].writerow([" ", mono_space_count])
-    
+    emit1(f" ,{mono_space_count}\n".encode())
+
     for char, freq in punct_stats.items():
         # Escape backslash for CSV
         display_char = "\\\\" if char == '\\' else ("\\n" if char == '\n' else char)
-        writers[1].writerow([display_char, freq])
+        emit1(f"{csv_field(display_char)},{freq}\n".encode())
 
-    for (c1, c2), freq in bi_space.items():
-        writers[2].writerow([c1, c2, freq])
-        
-    for (c1, c2, c3), freq in tri_space.items():
-        writers[3].writerow([c1, c2, c3, freq])
+    buf2.extend(bi_rows)
+    buf3.extend(tri_rows)
 
     # Inject Enter Bigrams
     enter_freq = punct_stats['\n']
-    writers[2].writerow(['.', '\\n', int(enter_freq * 0.9)])
-    writers[2].writerow(['\\n', 't', int(enter_freq * 0.1)])
+    emit2(f".,\\n,{int(enter_freq * 0.9)}\n".encode())
+    emit2(f"\\n,t,{int(enter_freq * 0.1)}\n".encode())
 
+    flush_rows()
     for f in files.values():
         f.close()
 